@@ -0,0 +1,115 @@
+import json
+import os
+import time
+from typing import Any, Protocol
+
+
+class JobStore(Protocol):
+    """Where job status dicts live, so the API and background tasks can share them."""
+
+    async def get(self, job_id: str) -> dict[str, Any] | None: ...
+
+    async def set(self, job_id: str, job: dict[str, Any]) -> None: ...
+
+    async def update(self, job_id: str, **fields: Any) -> None: ...
+
+    async def delete(self, job_id: str) -> None: ...
+
+    async def purge_expired(self) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class InMemoryJobStore:
+    """
+    Jobs kept in a per-process dict: {job_id: {..., "created_at": float}}.
+    Only valid with a single Uvicorn worker. purge_expired() removes jobs not
+    written for ttl_seconds, so a long conversion that keeps reporting progress stays alive.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._jobs: dict[str, dict[str, Any]] = {}
+        self._touched: dict[str, float] = {}
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        return self._jobs.get(job_id)
+
+    async def set(self, job_id: str, job: dict[str, Any]) -> None:
+        self._jobs[job_id] = job
+        self._touched[job_id] = time.time()
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        if job_id in self._jobs:
+            self._jobs[job_id].update(fields)
+            self._touched[job_id] = time.time()
+
+    async def delete(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+        self._touched.pop(job_id, None)
+
+    async def purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        expired = [jid for jid, touched in self._touched.items() if touched < cutoff]
+        for jid in expired:
+            await self.delete(jid)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisJobStore:
+    """
+    Jobs stored as Redis hashes under "job:<id>" (one JSON-encoded value per field),
+    shared by every Uvicorn worker. update() writes only the changed fields, so
+    concurrent progress updates can't overwrite each other with stale copies.
+    Each write refreshes the key TTL, so expiry counts from the job's last update
+    and purge_expired() has nothing to do.
+    """
+
+    def __init__(self, url: str, ttl_seconds: int):
+        import redis.asyncio as redis  # only needed when REDIS_URL is set
+
+        self.ttl_seconds = ttl_seconds
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    async def _write(self, job_id: str, fields: dict[str, Any], replace: bool) -> None:
+        key = self._key(job_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            if replace:
+                pipe.delete(key)
+            pipe.hset(key, mapping={name: json.dumps(value) for name, value in fields.items()})
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def get(self, job_id: str) -> dict[str, Any] | None:
+        raw = await self._redis.hgetall(self._key(job_id))
+        return {name: json.loads(value) for name, value in raw.items()} if raw else None
+
+    async def set(self, job_id: str, job: dict[str, Any]) -> None:
+        await self._write(job_id, job, replace=True)
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        if fields:
+            await self._write(job_id, fields, replace=False)
+
+    async def delete(self, job_id: str) -> None:
+        await self._redis.delete(self._key(job_id))
+
+    async def purge_expired(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_job_store(ttl_seconds: int) -> JobStore:
+    """Use Redis when REDIS_URL is set (required for multiple workers), otherwise memory."""
+    url = os.environ.get("REDIS_URL")
+    if url:
+        return RedisJobStore(url, ttl_seconds)
+    return InMemoryJobStore(ttl_seconds)
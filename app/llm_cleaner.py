@@ -1,7 +1,24 @@
 import asyncio
+import hashlib
 import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
 
-from groq import AsyncGroq
+import httpx
+from groq import AsyncGroq, DefaultAsyncHttpxClient, RateLimitError
+
+MODEL = "llama-3.3-70b-versatile"
+
+# Retries per chunk after a 429 before falling back to the raw text
+MAX_RETRIES = 3
+
+# Adjacent chunks are packed into one request up to this many characters,
+# separated by CHUNK_BREAK so the response can be split back apart
+MAX_BATCH_CHARS = 12000
+CHUNK_BREAK = "\n<<<CHUNK_BREAK>>>\n"
 
 SYSTEM_PROMPT = """\
 You are a text preprocessor for text-to-speech audio conversion.
@@ -15,37 +32,313 @@ Rules:
 - Ensure punctuation creates natural pauses — add commas or periods only where clearly missing
 - Preserve paragraph breaks as natural pauses
 - Do NOT summarize, add commentary, skip content, or change the meaning in any way
+- Keep every <<<CHUNK_BREAK>>> marker exactly as written, on its own line and in its original position
 - Return ONLY the cleaned text — no explanations, labels, or prefixes\
 """
 
 
+# Shared across jobs so TCP/TLS connections are reused
+_client: AsyncGroq | None = None
+
+
 def _get_client() -> AsyncGroq:
-    api_key = os.environ.get("GROQ_API_KEY")
-    if not api_key:
-        raise RuntimeError(
-            "GROQ_API_KEY environment variable is not set. "
-            "Add it to your .env file locally or Railway environment variables."
+    """Return the process-wide Groq client, creating it on first use."""
+    global _client
+    if _client is None:
+        api_key = os.environ.get("GROQ_API_KEY")
+        if not api_key:
+            raise RuntimeError(
+                "GROQ_API_KEY environment variable is not set. "
+                "Add it to your .env file locally or Railway environment variables."
+            )
+        _client = AsyncGroq(
+            api_key=api_key,
+            max_retries=0,  # 429 retries are handled in _clean_chunk
+            http_client=DefaultAsyncHttpxClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared Groq client (called on app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+class AsyncTokenBucket:
+    """
+    Throttle requests to stay under per-minute request (rpm) and token (tpm) quotas.
+    Both budgets refill continuously; acquire() waits until enough of each is available.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        Wait for one request and `tokens` tokens. A request bigger than the whole
+        tpm budget waits for a full bucket and is charged in full, leaving the bucket
+        in debt, so the average rate still never exceeds tpm.
+        """
+        needed = min(tokens, self.tpm)
+        async with self._lock:  # waiters are served in arrival order
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= needed:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep(max(
+                    (1 - self._requests) * 60 / self.rpm,
+                    (needed - self._tokens) * 60 / self.tpm,
+                ))
+
+
+# GROQ_RPM / GROQ_TPM / GROQ_CONCURRENCY are totals for the API key. Each Uvicorn
+# worker (WEB_CONCURRENCY, set by run.py) gets an equal share, so together they stay within them.
+_WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+
+
+def _per_worker(name: str, default: str) -> int:
+    return max(1, int(os.environ.get(name, default)) // _WORKERS)
+
+
+# One bucket is shared by every job in this worker
+_bucket = AsyncTokenBucket(
+    rpm=_per_worker("GROQ_RPM", "30"),
+    tpm=_per_worker("GROQ_TPM", "6000"),
+)
+
+
+class ConcurrencyLimiter:
+    """
+    Async context manager capping how many requests run at once.
+    Unlike asyncio.Semaphore, the limit changes while requests are in flight:
+    it halves on a 429 (rate_limited) and grows back by one after `limit`
+    successful requests in a row (succeeded), never above max_limit — AIMD.
+    """
+
+    def __init__(self, max_limit: int, cooldown: float = 5.0):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self._active = 0
+        self._successes = 0
+        self._cooldown = cooldown  # 429s from one burst only shrink the limit once
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def __aexit__(self, *exc_info):
+        async with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    async def rate_limited(self) -> None:
+        now = time.monotonic()
+        async with self._cond:
+            self._successes = 0
+            if now - self._last_decrease >= self._cooldown:
+                self._last_decrease = now
+                self.limit = max(1, self.limit // 2)
+
+    async def succeeded(self) -> None:
+        async with self._cond:
+            if self.limit >= self.max_limit:
+                return
+            self._successes += 1
+            if self._successes >= self.limit:
+                self._successes = 0
+                self.limit += 1
+                self._cond.notify()  # one more request now fits
+
+
+_limiter = ConcurrencyLimiter(_per_worker("GROQ_CONCURRENCY", "5"))
+
+
+def _retry_delay(error: RateLimitError, attempt: int) -> float:
+    """Seconds to wait after a 429: the server's Retry-After if given, else exponential backoff."""
+    try:
+        delay = float(error.response.headers["retry-after"])
+    except (KeyError, ValueError):
+        delay = 2.0 ** attempt
+    return delay + random.uniform(0, 1)
+
+
+class CleanCache:
+    """
+    Persistent cache of cleaned chunks in SQLite, keyed on sha256 of the
+    model, system prompt and chunk text — so a prompt change invalidates old entries.
+    Best-effort: any SQLite error counts as a miss or a skipped write. Methods block,
+    so call them through asyncio.to_thread.
+    """
+
+    def __init__(self, path: Path):
+        # WAL lets several Uvicorn workers read while one writes; the short timeout
+        # turns lock contention into a quick miss instead of a stall
+        self._db = sqlite3.connect(str(path), timeout=1.0, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cleaned "
+            "(key TEXT PRIMARY KEY, text TEXT NOT NULL, created_at REAL NOT NULL DEFAULT 0)"
         )
-    return AsyncGroq(api_key=api_key)
+        try:
+            self._db.execute("ALTER TABLE cleaned ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        self._db.commit()
 
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(f"{MODEL}\0{SYSTEM_PROMPT}\0{text}".encode()).hexdigest()
 
-async def _clean_chunk(text: str, client: AsyncGroq, semaphore: asyncio.Semaphore) -> str:
-    """Send one chunk to Groq for cleaning. Falls back to original text on any error."""
-    async with semaphore:
+    def get_many(self, texts: list[str]) -> list[str | None]:
+        found: dict[str, str] = {}
+        keys = [self._key(text) for text in texts]
         try:
-            response = await client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": text},
-                ],
-                temperature=0.1,
-                max_tokens=2048,
-            )
-            cleaned = response.choices[0].message.content.strip()
-            return cleaned if cleaned else text
-        except Exception:
-            return text  # Silently fall back to original if Groq fails
+            with self._lock:
+                for key in keys:
+                    row = self._db.execute(
+                        "SELECT text FROM cleaned WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row:
+                        found[key] = row[0]
+        except sqlite3.Error:
+            pass  # Whatever was read before the error is still usable
+        return [found.get(key) for key in keys]
+
+    def put_many(self, items: list[tuple[str, str]]) -> None:
+        now = time.time()
+        try:
+            with self._lock, self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO cleaned (key, text, created_at) VALUES (?, ?, ?)",
+                    [(self._key(text), cleaned, now) for text, cleaned in items],
+                )
+        except sqlite3.Error:
+            pass
+
+    def purge(self, cutoff: float) -> None:
+        """Drop entries written before cutoff."""
+        try:
+            with self._lock, self._db:
+                self._db.execute("DELETE FROM cleaned WHERE created_at < ?", (cutoff,))
+        except sqlite3.Error:
+            pass
+
+
+_cache: CleanCache | None = None
+
+
+def setup_llm_cache(path: Path) -> None:
+    """Open the cleaning cache (called on app startup). Without it, every chunk goes to Groq."""
+    global _cache
+    try:
+        _cache = CleanCache(path)
+    except sqlite3.Error:
+        _cache = None
+
+
+async def purge_llm_cache(max_age_seconds: int) -> None:
+    """Remove cached cleanings older than max_age_seconds."""
+    if _cache:
+        await asyncio.to_thread(_cache.purge, time.time() - max_age_seconds)
+
+
+def _max_tokens(chars: int) -> int:
+    """Completion budget: cleaned text is about as long as the input, plus headroom for expansions."""
+    return chars // 3 + 256
+
+
+def _request_tokens(chars: int) -> int:
+    """Tokens a request counts against TPM: estimated prompt (~4 chars/token) plus max_tokens."""
+    return (len(SYSTEM_PROMPT) + chars) // 4 + _max_tokens(chars)
+
+
+async def _clean_chunk(text: str, client: AsyncGroq) -> str | None:
+    """Send one chunk (or a delimited batch) to Groq for cleaning. Returns None if Groq fails."""
+    async with _limiter:
+        for attempt in range(MAX_RETRIES + 1):
+            await _bucket.acquire(tokens=_request_tokens(len(text)))
+            try:
+                response = await client.chat.completions.create(
+                    model=MODEL,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": text},
+                    ],
+                    temperature=0.1,
+                    max_tokens=_max_tokens(len(text)),
+                )
+                await _limiter.succeeded()
+                cleaned = response.choices[0].message.content.strip()
+                return cleaned or None
+            except RateLimitError as e:
+                await _limiter.rate_limited()
+                if attempt == MAX_RETRIES:
+                    return None
+                await asyncio.sleep(_retry_delay(e, attempt))
+            except Exception:
+                return None
+    return None
+
+
+def _make_batches(chunks: list[str]) -> list[list[int]]:
+    """
+    Greedily group adjacent chunk indices so each batch stays within MAX_BATCH_CHARS
+    and a single request never costs more than this worker's per-minute token budget.
+    """
+    batches: list[list[int]] = []
+    size = 0
+    for i, chunk in enumerate(chunks):
+        added = len(chunk) + len(CHUNK_BREAK)
+        grown = size + added
+        if batches and grown <= MAX_BATCH_CHARS and _request_tokens(grown) <= _bucket.tpm:
+            batches[-1].append(i)
+            size += added
+        else:
+            batches.append([i])
+            size = len(chunk)
+    return batches
+
+
+async def _clean_batch(batch: list[str], client: AsyncGroq) -> list[str | None]:
+    """
+    Clean several chunks in one request, joined by CHUNK_BREAK.
+    If the response doesn't split back into the same number of parts,
+    each chunk is re-sent on its own. Chunks Groq failed on come back as None.
+    """
+    if len(batch) == 1:
+        return [await _clean_chunk(batch[0], client)]
+
+    cleaned = await _clean_chunk(CHUNK_BREAK.join(batch), client)
+    if cleaned is None:
+        return [None] * len(batch)
+    parts = [part.strip() for part in cleaned.split(CHUNK_BREAK.strip())]
+    if len(parts) != len(batch):
+        return list(await asyncio.gather(*[_clean_chunk(chunk, client) for chunk in batch]))
+    return [part or None for part in parts]
 
 
 async def clean_chunks_with_llm(
@@ -54,21 +347,49 @@ async def clean_chunks_with_llm(
 ) -> list[str]:
     """
     Clean all text chunks through Groq LLM concurrently.
-    Uses a semaphore to stay within Groq's rate limits (5 concurrent requests).
+    Chunks already in the cleaning cache are reused; the rest are packed into
+    batches of up to MAX_BATCH_CHARS (and the per-worker token budget) per request.
+    Concurrency is capped by a shared limiter (5 requests by default) that backs off on 429s
+    and a shared token bucket keeps within Groq's per-minute rate limits; both
+    are split evenly across Uvicorn workers.
+    Any chunk Groq fails on is returned unchanged.
     If GROQ_API_KEY is not set, returns chunks unchanged.
     """
     if not os.environ.get("GROQ_API_KEY"):
         return chunks
 
     client = _get_client()
-    semaphore = asyncio.Semaphore(5)
     total = len(chunks)
-    results: list[str] = [""] * total
+    results: list[str] = list(chunks)
+    pending: list[int] = []
+
+    cached_chunks = await asyncio.to_thread(_cache.get_many, chunks) if _cache else [None] * total
+    for i, cached in enumerate(cached_chunks):
+        if cached is None:
+            pending.append(i)
+        else:
+            results[i] = cached
+
+    done = total - len(pending)
+    if done and progress_callback:
+        await progress_callback(done, total)
+
+    async def process(indices: list[int]):
+        nonlocal done
+        batch = [chunks[i] for i in indices]
+        cleaned = await _clean_batch(batch, client)
+        fresh = []
+        for i, chunk, text in zip(indices, batch, cleaned):
+            if text is not None:
+                results[i] = text
+                fresh.append((chunk, text))
+        if _cache and fresh:
+            await asyncio.to_thread(_cache.put_many, fresh)
 
-    async def process(i: int, chunk: str):
-        results[i] = await _clean_chunk(chunk, client, semaphore)
+        done += len(indices)
         if progress_callback:
-            await progress_callback(i + 1, total)
+            await progress_callback(done, total)
 
-    await asyncio.gather(*[process(i, chunk) for i, chunk in enumerate(chunks)])
+    batches = _make_batches([chunks[i] for i in pending])
+    await asyncio.gather(*[process([pending[j] for j in batch]) for batch in batches])
     return results
@@ -1,39 +1,46 @@
 import asyncio
+import json
 import os
 import time
 import uuid
 from pathlib import Path
-from typing import Dict, Any
 
-import aiofiles
 from fastapi import FastAPI, File, Form, UploadFile, HTTPException
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 
-from app.pdf_parser import extract_text, chunk_text, SUPPORTED_EXTENSIONS
+from app.pdf_parser import extract_text, chunk_text, shutdown_extract_pool, SUPPORTED_EXTENSIONS
 from app.tts_engine import (
     get_voices,
     convert_chunks_to_audio,
     merge_audio_files,
     cleanup_chunks,
+    MERGE_REENCODE,
 )
-from app.llm_cleaner import clean_chunks_with_llm
+from app.llm_cleaner import clean_chunks_with_llm, close_client, setup_llm_cache, purge_llm_cache
+from app.job_store import create_job_store
 
 BASE_DIR = Path(__file__).parent.parent
 UPLOADS_DIR = BASE_DIR / "uploads"
 OUTPUTS_DIR = BASE_DIR / "outputs"
 STATIC_DIR = BASE_DIR / "static"
+CACHE_DIR = BASE_DIR / "cache"
 
 UPLOADS_DIR.mkdir(exist_ok=True)
 OUTPUTS_DIR.mkdir(exist_ok=True)
+CACHE_DIR.mkdir(exist_ok=True)
 
 app = FastAPI(title="Zelos Audiobook Converter")
 
 MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # 50 MB
+UPLOAD_CHUNK_BYTES = 1024 * 1024     # 1 MB read size when streaming uploads
 JOB_TTL_SECONDS = 2 * 60 * 60       # 2 hours
+VOICES_TTL_SECONDS = 24 * 60 * 60   # 24 hours
+LLM_CACHE_TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL_SECONDS", 24 * 60 * 60))
+VOICES_CACHE_PATH = CACHE_DIR / "voices.json"
 
-# In-memory job store: {job_id: {..., "created_at": float}}
-jobs: Dict[str, Any] = {}
+# Job status store: in-memory by default, Redis when REDIS_URL is set (multi-worker)
+jobs = create_job_store(JOB_TTL_SECONDS)
 
 # Cache voices so we don't re-fetch on every request
 _voices_cache: list[dict] | None = None
@@ -44,14 +51,65 @@ async def start_cleanup_task():
     asyncio.create_task(_periodic_cleanup())
 
 
+@app.on_event("startup")
+async def open_llm_cache():
+    setup_llm_cache(CACHE_DIR / "llm_cache.sqlite3")
+
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await close_client()
+
+
+@app.on_event("shutdown")
+async def close_job_store():
+    await jobs.close()
+
+
+@app.on_event("shutdown")
+async def stop_extract_pool():
+    await asyncio.to_thread(shutdown_extract_pool)
+
+
+@app.on_event("startup")
+async def warm_voices_cache():
+    try:
+        await _load_voices()
+    except Exception:
+        pass  # Network hiccup at boot — api_get_voices retries on first request
+
+
 @app.get("/api/voices")
 async def api_get_voices():
-    global _voices_cache
     if _voices_cache is None:
-        _voices_cache = await get_voices()
+        await _load_voices()
     return {"voices": _voices_cache}
 
 
+async def _load_voices():
+    """Fill _voices_cache from voices.json if under VOICES_TTL_SECONDS old, else from edge-tts."""
+    global _voices_cache
+    try:
+        if time.time() - VOICES_CACHE_PATH.stat().st_mtime < VOICES_TTL_SECONDS:
+            _voices_cache = json.loads(await asyncio.to_thread(VOICES_CACHE_PATH.read_text, "utf-8"))
+            return
+    except (OSError, ValueError):
+        pass  # Missing or unreadable cache file — fetch fresh
+
+    _voices_cache = await get_voices()
+    try:
+        await asyncio.to_thread(_write_voices_cache, _voices_cache)
+    except OSError:
+        pass  # Serving from memory still works; next boot just fetches again
+
+
+def _write_voices_cache(voices: list[dict]) -> None:
+    """Write voices.json atomically so concurrent workers never read a partial file."""
+    tmp = VOICES_CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(voices), encoding="utf-8")
+    os.replace(tmp, VOICES_CACHE_PATH)
+
+
 @app.post("/api/convert")
 async def convert(
     file: UploadFile = File(...),
@@ -61,20 +119,16 @@ async def convert(
     if ext not in SUPPORTED_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported.")
 
-    content = await file.read()
-    if len(content) > MAX_UPLOAD_BYTES:
+    job_id = str(uuid.uuid4())
+    file_path = UPLOADS_DIR / f"{job_id}{ext}"
+
+    if not await asyncio.to_thread(_save_upload, file.file, file_path):
         raise HTTPException(
             status_code=413,
             detail=f"File too large. Maximum allowed size is {MAX_UPLOAD_BYTES // 1024 // 1024} MB."
         )
 
-    job_id = str(uuid.uuid4())
-    file_path = UPLOADS_DIR / f"{job_id}{ext}"
-
-    async with aiofiles.open(file_path, "wb") as f:
-        await f.write(content)
-
-    jobs[job_id] = {
+    await jobs.set(job_id, {
         "status": "processing",
         "phase": "extracting",
         "progress": 0,
@@ -82,23 +136,41 @@ async def convert(
         "filename": file.filename,
         "created_at": time.time(),
         "error": None,
-    }
+    })
 
     asyncio.create_task(_run_conversion(job_id, file_path, voice))
     return {"job_id": job_id}
 
 
+def _save_upload(src, dest: Path) -> bool:
+    """
+    Stream an upload to disk in UPLOAD_CHUNK_BYTES pieces.
+    Returns False (and removes the partial file) once MAX_UPLOAD_BYTES is exceeded.
+    """
+    written = 0
+    with open(dest, "wb") as out:
+        while chunk := src.read(UPLOAD_CHUNK_BYTES):
+            written += len(chunk)
+            if written > MAX_UPLOAD_BYTES:
+                break
+            out.write(chunk)
+        else:
+            return True
+    dest.unlink(missing_ok=True)
+    return False
+
+
 @app.get("/api/status/{job_id}")
-def get_status(job_id: str):
-    job = jobs.get(job_id)
+async def get_status(job_id: str):
+    job = await jobs.get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found.")
     return job
 
 
 @app.get("/api/download/{job_id}")
-def download(job_id: str):
-    job = jobs.get(job_id)
+async def download(job_id: str):
+    job = await jobs.get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found.")
     if job["status"] != "done":
@@ -120,44 +192,48 @@ async def _run_conversion(job_id: str, pdf_path: Path, voice: str):
     """Background task: extract → LLM clean → TTS → merge."""
     try:
         # Phase 1: Extract text
-        jobs[job_id]["phase"] = "extracting"
-        text = extract_text(str(pdf_path))
+        await jobs.update(job_id, phase="extracting")
+        text = await asyncio.to_thread(extract_text, str(pdf_path))
         if not text.strip():
-            jobs[job_id].update({"status": "error", "error": "No readable text found in the document."})
+            await jobs.update(job_id, status="error", error="No readable text found in the document.")
             return
 
         chunks = chunk_text(text)
-        jobs[job_id]["total"] = len(chunks)
+        await jobs.update(job_id, total=len(chunks))
 
         # Phase 2: LLM cleaning (skipped gracefully if no API key)
-        jobs[job_id].update({"phase": "cleaning", "progress": 0})
+        await jobs.update(job_id, phase="cleaning", progress=0)
 
         async def on_clean_progress(done: int, total: int):
-            jobs[job_id]["progress"] = done
+            await jobs.update(job_id, progress=done)
 
         chunks = await clean_chunks_with_llm(chunks, progress_callback=on_clean_progress)
 
         # Phase 3: TTS conversion
-        jobs[job_id].update({"phase": "converting", "progress": 0})
+        await jobs.update(job_id, phase="converting", progress=0)
 
         async def on_tts_progress(done: int, total: int):
-            jobs[job_id]["progress"] = done
+            await jobs.update(job_id, progress=done)
 
+        # Finished chunks are appended to the output while later ones are still
+        # converting, unless the merge has to re-encode through ffmpeg
+        output_path = OUTPUTS_DIR / f"{job_id}.mp3"
         chunk_files = await convert_chunks_to_audio(
             chunks, voice, str(UPLOADS_DIR), job_id,
             progress_callback=on_tts_progress,
+            merge_into=None if MERGE_REENCODE else str(output_path),
         )
 
         # Phase 4: Merge
-        jobs[job_id]["phase"] = "merging"
-        output_path = OUTPUTS_DIR / f"{job_id}.mp3"
-        merge_audio_files(chunk_files, str(output_path))
-        cleanup_chunks(chunk_files)
+        if MERGE_REENCODE:
+            await jobs.update(job_id, phase="merging")
+            await asyncio.to_thread(merge_audio_files, chunk_files, str(output_path), True)
+        await asyncio.to_thread(cleanup_chunks, chunk_files)
 
-        jobs[job_id]["status"] = "done"
+        await jobs.update(job_id, status="done")
 
     except Exception as e:
-        jobs[job_id].update({"status": "error", "error": str(e)})
+        await jobs.update(job_id, status="error", error=str(e))
     finally:
         try:
             pdf_path.unlink()
@@ -166,18 +242,29 @@ async def _run_conversion(job_id: str, pdf_path: Path, voice: str):
 
 
 async def _periodic_cleanup():
-    """Remove jobs and their output files older than JOB_TTL_SECONDS every 30 minutes."""
+    """
+    Every 30 minutes, remove jobs and output files older than JOB_TTL_SECONDS
+    and cached LLM cleanings (document text) older than LLM_CACHE_TTL_SECONDS.
+    """
     while True:
         await asyncio.sleep(30 * 60)
-        cutoff = time.time() - JOB_TTL_SECONDS
-        expired = [jid for jid, j in jobs.items() if j.get("created_at", 0) < cutoff]
-        for jid in expired:
-            output = OUTPUTS_DIR / f"{jid}.mp3"
-            try:
+        await jobs.purge_expired()
+        await purge_llm_cache(LLM_CACHE_TTL_SECONDS)
+        # One worker-thread hop per sweep for all the deletions
+        await asyncio.to_thread(_remove_outputs, time.time() - JOB_TTL_SECONDS)
+
+
+def _remove_outputs(cutoff: float) -> None:
+    """
+    Delete output mp3s last written before cutoff, ignoring files already gone.
+    Going by file age rather than job records works even when Redis expires the jobs.
+    """
+    for output in OUTPUTS_DIR.glob("*.mp3"):
+        try:
+            if output.stat().st_mtime < cutoff:
                 output.unlink(missing_ok=True)
-            except OSError:
-                pass
-            jobs.pop(jid, None)
+        except OSError:
+            pass
 
 
 # Serve frontend — must be last
@@ -1,5 +1,9 @@
+import multiprocessing
+import os
 import re
+import threading
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import fitz  # PyMuPDF
 from docx import Document
@@ -7,6 +11,48 @@ from docx import Document
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx"}
 
+# PDFs with fewer pages are extracted serially — get_text is ~1 ms/page, so below a few
+# hundred pages handing ranges to worker processes costs more than it saves
+PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "500"))
+
+# Worker processes for large PDFs: PDF_EXTRACT_WORKERS, else the CPUs this process may
+# run on (capped at 4). Set it explicitly when a container's CPU quota is below its affinity.
+if hasattr(os, "sched_getaffinity"):
+    _AVAILABLE_CPUS = len(os.sched_getaffinity(0))
+else:  # Windows / macOS
+    _AVAILABLE_CPUS = os.cpu_count() or 1
+EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", min(4, _AVAILABLE_CPUS)))
+
+# Long-lived pool shared by every job in this process, created on first large PDF
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+# Patterns used by the cleaning and chunking helpers, compiled once at import
+_RE_DECOR = re.compile(r'[-_=~.*•·\s]{3,}')
+_RE_PAGENUM_INT = re.compile(r'\d{1,4}')
+_RE_ROMAN = re.compile(r'[ivxlcdmIVXLCDM]{1,6}')
+_RE_PAGEDASH = re.compile(r'[-–|]?\s*\d{1,4}\s*[-–|]?')
+_RE_HEADING = re.compile(r'(chapter|section|part|book)\s+[\w\s]{1,30}', re.IGNORECASE)
+_RE_SENTENCE_GAP = re.compile(r'([.!?])(?: \s|[^\S ])\s*')  # any gap but a single space
+_RE_LAST_SENTENCE_END = re.compile(r'.*[.!?]\s', re.DOTALL)  # greedy: finds the last one
+_RE_WHITESPACE = re.compile(r'\s*')
+
+
+class _PrintableTable(dict):
+    """
+    str.translate table: smart quotes become plain quotes, any other character
+    outside printable ASCII (newlines excepted) becomes a space.
+    Entries are filled in on first lookup, so only code points actually seen are stored.
+    """
+
+    def __missing__(self, cp: int) -> int:
+        mapped = cp if 0x20 <= cp <= 0x7E or cp == 0x0A else 0x20
+        self[cp] = mapped
+        return mapped
+
+
+_PRINTABLE = _PrintableTable({0x201C: '"', 0x201D: '"', 0x2018: "'", 0x2019: "'"})
+
 
 def extract_text(file_path: str) -> str:
     """Extract and clean text from a PDF or DOCX file."""
@@ -22,12 +68,65 @@ def extract_text(file_path: str) -> str:
 def _extract_pdf(pdf_path: str) -> str:
     """Extract text from a PDF using PyMuPDF."""
     doc = fitz.open(pdf_path)
-    pages_text = [page.get_text("text") for page in doc]
-    doc.close()
+    page_count = doc.page_count
+    workers = min(EXTRACT_WORKERS, page_count)
+    if workers < 2 or page_count < PARALLEL_MIN_PAGES:
+        pages_text = [page.get_text("text") for page in doc]
+        doc.close()
+    else:
+        doc.close()
+        pages_text = _extract_pdf_parallel(pdf_path, page_count, workers)
     pages_text = remove_repeated_lines(pages_text)
     return clean_text("\n".join(pages_text))
 
 
+def _extract_pdf_parallel(pdf_path: str, page_count: int, workers: int) -> list[str]:
+    """
+    Split the page range across worker processes, each opening its own copy of the document.
+    PyMuPDF objects are not thread-safe, so processes are used rather than threads.
+    """
+    step = -(-page_count // workers)  # ceil division
+    ranges = _get_pool().map(
+        _extract_page_range,
+        [pdf_path] * workers,
+        range(0, page_count, step),
+        range(step, page_count + step, step),
+    )
+    return [text for page_range in ranges for text in page_range]
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Return the shared extraction pool, starting it on first use."""
+    global _pool
+    with _pool_lock:  # extract_text runs in worker threads
+        if _pool is None:
+            # spawn, not fork: the caller runs in a multi-threaded server process, and a
+            # forked child could inherit a lock held by another thread
+            _pool = ProcessPoolExecutor(
+                max_workers=EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_extract_pool() -> None:
+    """Stop the extraction worker processes (called on app shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> list[str]:
+    """Extract text for pages [start, stop) — runs inside a worker process."""
+    doc = fitz.open(pdf_path)
+    try:
+        return [doc[i].get_text("text") for i in range(start, min(stop, doc.page_count))]
+    finally:
+        doc.close()
+
+
 def _extract_docx(docx_path: str) -> str:
     """Extract text from a DOCX file using python-docx."""
     doc = Document(docx_path)
@@ -65,41 +164,51 @@ def remove_repeated_lines(pages: list[str]) -> list[str]:
         return pages
 
     threshold = max(3, len(pages) * 0.20)
+    page_lines = [page.splitlines() for page in pages]
 
-    # Count how often each stripped line appears across pages
+    # Count on how many pages each stripped line appears (a set per page counts it once)
     line_counts: Counter = Counter()
-    for page in pages:
-        seen_on_page = set()
-        for line in page.splitlines():
-            stripped = line.strip()
-            if stripped and stripped not in seen_on_page:
-                line_counts[stripped] += 1
-                seen_on_page.add(stripped)
+    for lines in page_lines:
+        line_counts.update(set(map(str.strip, lines)))
+    line_counts.pop("", None)
 
     repeated = {line for line, count in line_counts.items() if count >= threshold}
 
-    cleaned = []
-    for page in pages:
-        lines = [
-            line for line in page.splitlines()
-            if line.strip() not in repeated
-        ]
-        cleaned.append("\n".join(lines))
-
-    return cleaned
+    return [
+        "\n".join(line for line in lines if line.strip() not in repeated)
+        for lines in page_lines
+    ]
 
 
 def clean_text(text: str) -> str:
-    """Remove noise commonly found in extracted PDF text."""
-    lines = text.splitlines()
-    cleaned_lines = []
-
-    for line in lines:
+    """
+    Remove noise commonly found in extracted PDF text.
+    Works in a single pass over the lines, building paragraphs as it goes
+    rather than rewriting the whole document string once per fix-up.
+    """
+    paragraphs = []
+    pieces: list[str] = []  # lines of the paragraph currently being built
+    hyphenated = False      # previous kept line ended with "-"
+
+    def flush():
+        if pieces:
+            # Normalize smart quotes, blank out non-printable / control
+            # characters, then collapse spaces
+            paragraph = " ".join(" ".join(pieces).translate(_PRINTABLE).split())
+            if paragraph:
+                paragraphs.append(paragraph)
+            pieces.clear()
+
+    for line in text.splitlines():
         stripped = line.strip()
 
-        # Skip blank lines temporarily (will restore paragraph breaks)
+        # Blank line = paragraph break (unless it follows a hyphenated word)
         if not stripped:
-            cleaned_lines.append("")
+            if hyphenated:
+                pieces[-1] = pieces[-1][:-1]
+                hyphenated = False
+            else:
+                flush()
             continue
 
         # Remove standalone page numbers: digits only, roman numerals, or "Page N"
@@ -111,74 +220,66 @@ def clean_text(text: str) -> str:
             continue
 
         # Remove lines that are purely decorative (dashes, underscores, dots)
-        if re.fullmatch(r'[-_=~.*•·\s]{3,}', stripped):
+        if _RE_DECOR.fullmatch(stripped):
             continue
 
-        cleaned_lines.append(line)
-
-    text = "\n".join(cleaned_lines)
-
-    # Fix hyphenation at line breaks (e.g., "some-\nword" -> "someword")
-    text = re.sub(r'-\n', '', text)
-
-    # Join lines that are not paragraph breaks (single newline = continuation)
-    text = re.sub(r'(?<!\n)\n(?!\n)', ' ', text)
-
-    # Collapse 3+ blank lines into a single paragraph break
-    text = re.sub(r'\n{3,}', '\n\n', text)
-
-    # Clean up quotation mark noise — normalize smart quotes to plain
-    text = text.replace('\u201c', '"').replace('\u201d', '"')
-    text = text.replace('\u2018', "'").replace('\u2019', "'")
-
-    # Remove non-printable / control characters (keep newlines)
-    text = re.sub(r'[^\x20-\x7E\n]', ' ', text)
+        # Fix hyphenation at line breaks (e.g., "some-\nword" -> "someword"),
+        # otherwise a single newline is a continuation of the same paragraph
+        if hyphenated:
+            pieces[-1] = pieces[-1][:-1] + line
+        else:
+            pieces.append(line)
+        hyphenated = line.endswith("-")
 
-    # Collapse multiple spaces
-    text = re.sub(r' {2,}', ' ', text)
+    flush()
 
     # Remove "quoted" standalone lines that are just a label, e.g. "Chapter 1"
     # but keep them if they're followed by real content (handled by chunking)
 
-    return text.strip()
+    return "\n\n".join(paragraphs)
 
 
 def is_page_number(line: str) -> bool:
     """Return True if the line looks like a page number or section label to skip."""
     # Plain integer
-    if re.fullmatch(r'\d{1,4}', line):
+    if _RE_PAGENUM_INT.fullmatch(line):
         return True
     # Roman numerals (i, ii, iii, iv, v, vi, vii, viii, ix, x, xi...)
-    if re.fullmatch(r'[ivxlcdmIVXLCDM]{1,6}', line):
+    if _RE_ROMAN.fullmatch(line):
         return True
     # "Page 42" or "- 42 -" or "42 |" patterns
-    if re.fullmatch(r'[-–|]?\s*\d{1,4}\s*[-–|]?', line):
+    if _RE_PAGEDASH.fullmatch(line):
         return True
     # "Chapter 1" / "CHAPTER ONE" alone on a line under 40 chars
-    if re.fullmatch(r'(chapter|section|part|book)\s+[\w\s]{1,30}', line, re.IGNORECASE):
+    if _RE_HEADING.fullmatch(line):
         return False  # Keep chapter headings — read them once
     return False
 
 
 def chunk_text(text: str, max_chars: int = 3000) -> list[str]:
-    """Split text into chunks at sentence boundaries for TTS processing."""
-    sentences = re.split(r'(?<=[.!?])\s+', text)
+    """
+    Split text into chunks at sentence boundaries for TTS processing.
+    Each chunk is found with one regex search for the last sentence end that fits,
+    so the scanning happens in C rather than looping over every sentence in Python.
+    A sentence longer than max_chars is cut at max_chars.
+    """
     chunks = []
-    current = ""
+    pos = _RE_WHITESPACE.match(text).end()
+    size = len(text)
 
-    for sentence in sentences:
-        if len(current) + len(sentence) + 1 <= max_chars:
-            current += (" " if current else "") + sentence
+    while pos < size:
+        end = pos + max_chars
+        if end >= size:
+            piece, pos = text[pos:], size
         else:
-            if current:
-                chunks.append(current.strip())
-            if len(sentence) > max_chars:
-                for i in range(0, len(sentence), max_chars):
-                    chunks.append(sentence[i:i + max_chars])
-            else:
-                current = sentence
+            last = _RE_LAST_SENTENCE_END.match(text, pos, end + 1)
+            cut = last.end() - 1 if last else end
+            piece = text[pos:cut]
+            pos = _RE_WHITESPACE.match(text, cut).end()
 
-    if current:
-        chunks.append(current.strip())
+        # Sentences within a chunk are joined by single spaces
+        piece = _RE_SENTENCE_GAP.sub(r"\1 ", piece).strip()
+        if piece:
+            chunks.append(piece)
 
-    return [c for c in chunks if c.strip()]
+    return chunks
@@ -1,12 +1,30 @@
 import asyncio
+import functools
 import os
 import shutil
 import subprocess
 import edge_tts
 
+# Max simultaneous edge-tts requests per job
+TTS_CONCURRENCY = max(1, int(os.environ.get("TTS_CONCURRENCY", "8")))
 
+# Streamed TTS audio is buffered up to this many bytes between disk writes
+STREAM_FLUSH_BYTES = 64 * 1024
+
+# Set MERGE_REENCODE=1 to merge through ffmpeg (smaller mono 32 kbps output)
+# instead of concatenating the chunk mp3s directly
+MERGE_REENCODE = os.environ.get("MERGE_REENCODE") == "1"
+
+# Output encoding used by the ffmpeg (MERGE_REENCODE) merge
+REENCODE_ARGS = ["-ac", "1", "-ar", "22050", "-b:a", "32k"]
+
+
+@functools.cache
 def _find_ffmpeg() -> str:
-    """Locate the ffmpeg binary, checking PATH and common install locations."""
+    """
+    Locate the ffmpeg binary, checking PATH and common install locations.
+    The result is cached; a missing binary raises and is looked up again next call.
+    """
     path = shutil.which("ffmpeg")
     if path:
         return path
@@ -75,9 +93,24 @@ def _locale_to_name(locale: str) -> str:
 
 
 async def text_chunk_to_audio(text: str, voice: str, output_path: str) -> None:
-    """Convert a single text chunk to an audio file using edge-tts."""
+    """
+    Convert a single text chunk to an audio file, writing audio as edge-tts streams it.
+    Data is flushed to disk in worker threads every STREAM_FLUSH_BYTES.
+    """
     communicate = edge_tts.Communicate(text, voice)
-    await communicate.save(output_path)
+    f = await asyncio.to_thread(open, output_path, "wb")
+    try:
+        pending = bytearray()
+        async for message in communicate.stream():
+            if message["type"] == "audio":
+                pending += message["data"]
+                if len(pending) >= STREAM_FLUSH_BYTES:
+                    await asyncio.to_thread(f.write, bytes(pending))
+                    pending.clear()
+        if pending:
+            await asyncio.to_thread(f.write, bytes(pending))
+    finally:
+        await asyncio.to_thread(f.close)
 
 
 async def convert_chunks_to_audio(
@@ -86,24 +119,105 @@ async def convert_chunks_to_audio(
     temp_dir: str,
     job_id: str,
     progress_callback=None,
+    merge_into: str | None = None,
 ) -> list[str]:
-    """Convert all text chunks to individual audio files."""
-    audio_files = []
+    """
+    Convert all text chunks to individual audio files concurrently.
+    Uses a semaphore to cap parallel edge-tts connections (TTS_CONCURRENCY, default 8).
+    Returned paths keep the original chunk order. If any chunk fails, the rest are
+    cancelled and their files removed before the error is re-raised.
+    If merge_into is given, chunks are appended to that mp3 (in order) as soon as
+    they and every earlier chunk are done, so no separate merge step is needed.
+    """
     total = len(chunks)
+    audio_files: list[str] = [""] * total
+    semaphore = asyncio.Semaphore(TTS_CONCURRENCY)
+    done = 0
+    prefix = os.path.join(temp_dir, f"{job_id}_chunk_")
+    finished: asyncio.Queue[int] = asyncio.Queue()
 
-    for i, chunk in enumerate(chunks):
-        chunk_path = os.path.join(temp_dir, f"{job_id}_chunk_{i:04d}.mp3")
-        await text_chunk_to_audio(chunk, voice, chunk_path)
-        audio_files.append(chunk_path)
+    async def process(i: int, chunk: str):
+        nonlocal done
+        chunk_path = f"{prefix}{i:04d}.mp3"
+        async with semaphore:
+            await text_chunk_to_audio(chunk, voice, chunk_path)
+        audio_files[i] = chunk_path
+        finished.put_nowait(i)
 
+        done += 1
         if progress_callback:
-            await progress_callback(i + 1, total)
+            await progress_callback(done, total)
+
+    async def merge():
+        ready: set[int] = set()
+        next_index = 0
+        out = await asyncio.to_thread(open, merge_into, "wb")
+        try:
+            while next_index < total:
+                ready.add(await finished.get())
+                while next_index in ready:
+                    await asyncio.to_thread(
+                        _append_mp3, out, audio_files[next_index], next_index > 0
+                    )
+                    next_index += 1
+        finally:
+            await asyncio.to_thread(out.close)
 
+    tasks = [asyncio.create_task(process(i, chunk)) for i, chunk in enumerate(chunks)]
+    if merge_into:
+        tasks.append(asyncio.create_task(merge()))
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # Stop the remaining conversions and remove everything this job wrote,
+        # including chunk files that were only partially streamed
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        partial = [f"{prefix}{i:04d}.mp3" for i in range(total)]
+        if merge_into:
+            partial.append(merge_into)
+        await asyncio.to_thread(cleanup_chunks, partial)
+        raise
     return audio_files
 
 
-def merge_audio_files(audio_files: list[str], output_path: str) -> None:
-    """Merge multiple mp3 files into a single audiobook file using ffmpeg."""
+def merge_audio_files(audio_files: list[str], output_path: str, reencode: bool = MERGE_REENCODE) -> None:
+    """
+    Merge multiple mp3 files into a single audiobook file.
+    By default the MPEG frames are concatenated in-process; with reencode=True
+    the merge goes through ffmpeg instead (see _merge_with_ffmpeg).
+    """
+    if reencode:
+        _merge_with_ffmpeg(audio_files, output_path)
+        return
+
+    with open(output_path, "wb") as out:
+        for n, path in enumerate(audio_files):
+            _append_mp3(out, path, strip_id3=n > 0)
+
+
+def _append_mp3(out, path: str, strip_id3: bool) -> None:
+    """Copy one mp3's bytes onto out; only the first file of a merge keeps its ID3 tag."""
+    with open(path, "rb") as f:
+        if strip_id3:
+            f.seek(_id3v2_size(f.read(10)))
+        shutil.copyfileobj(f, out, 1 << 20)
+
+
+def _id3v2_size(header: bytes) -> int:
+    """Byte length of the ID3v2 tag a file starts with, or 0 if it has none."""
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    # Tag size is a 28-bit "synchsafe" integer (7 bits per byte)
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    if header[5] & 0x10:  # footer present
+        size += 10
+    return 10 + size
+
+
+def _merge_with_ffmpeg(audio_files: list[str], output_path: str) -> None:
+    """Merge mp3 files using ffmpeg's concat demuxer, re-encoding to REENCODE_ARGS."""
     list_path = output_path + ".txt"
     with open(list_path, "w", encoding="utf-8") as f:
         for path in audio_files:
@@ -111,20 +225,7 @@ def merge_audio_files(audio_files: list[str], output_path: str) -> None:
             f.write(f"file '{safe}'\n")
 
     try:
-        subprocess.run(
-            [
-                _find_ffmpeg(), "-y",
-                "-f", "concat",
-                "-safe", "0",
-                "-i", list_path,
-                "-ac", "1",
-                "-ar", "22050",
-                "-b:a", "32k",
-                output_path,
-            ],
-            check=True,
-            capture_output=True,
-        )
+        _run_concat(list_path, output_path, REENCODE_ARGS)
     finally:
         try:
             os.remove(list_path)
@@ -132,8 +233,23 @@ def merge_audio_files(audio_files: list[str], output_path: str) -> None:
             pass
 
 
+def _run_concat(list_path: str, output_path: str, codec_args: list[str]) -> None:
+    subprocess.run(
+        [
+            _find_ffmpeg(), "-y",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", list_path,
+            *codec_args,
+            output_path,
+        ],
+        check=True,
+        capture_output=True,
+    )
+
+
 def cleanup_chunks(audio_files: list[str]) -> None:
-    """Remove temporary chunk files after merging."""
+    """Remove temporary chunk files after merging. Blocking — run via asyncio.to_thread."""
     for path in audio_files:
         try:
             os.remove(path)
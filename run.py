@@ -40,9 +40,18 @@ if __name__ == "__main__":
         print("  (Both devices must be on the same WiFi)")
         print("=" * 50 + "\n")
 
+    # Jobs must live in Redis for several workers to share them; otherwise stay single-process.
+    # Workers read WEB_CONCURRENCY to split the Groq rate limits between them.
+    if is_cloud and os.environ.get("REDIS_URL"):
+        workers = int(os.environ.get("WEB_CONCURRENCY", min(4, os.cpu_count() or 1)))
+    else:
+        workers = 1
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=port,
         reload=False,
+        workers=workers,
     )